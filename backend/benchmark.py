@@ -285,13 +285,13 @@ class Benchmarker:
             try:
                 # Text embedding timing
                 emb_start = time.perf_counter()
-                _ = self.engine.compute_text_embedding(query)
+                _ = self.engine.compute_text_embedding(query, use_cache=False)
                 emb_time = (time.perf_counter() - emb_start) * 1000
                 embedding_times.append(emb_time)
                 
                 # Full query timing
                 query_start = time.perf_counter()
-                _ = self.engine.search(query, self.db, limit=10)
+                _ = self.engine.search(query, self.db, limit=10, use_cache=False)
                 query_time = (time.perf_counter() - query_start) * 1000
                 query_times.append(query_time)
                 
@@ -1,5 +1,7 @@
+import sys
 import yaml
 import json
+import copy
 import time
 import logging
 import hashlib
@@ -12,6 +14,12 @@ from cryptography.hazmat.primitives import serialization, hashes
 from cryptography.hazmat.primitives.asymmetric import padding
 import os  # Added for os.chmod
 
+# libyaml-backed loader/dumper when PyYAML was built with it
+try:
+    from yaml import CSafeLoader as YamlLoader, CSafeDumper as YamlDumper
+except ImportError:
+    from yaml import SafeLoader as YamlLoader, SafeDumper as YamlDumper
+
 # --- CRYPTO CONFIG ---
 PUBLIC_KEY_PEM = """
 -----BEGIN PUBLIC KEY-----
@@ -27,6 +35,16 @@ lwIDAQAB
 
 logger = logging.getLogger("PrismConfig")
 
+# datetime.fromisoformat() accepts a trailing "Z" natively from Python 3.11
+_ISO_NATIVE_Z = sys.version_info >= (3, 11)
+
+
+def parse_iso_datetime(value: str) -> datetime:
+    """Parse an ISO-8601 timestamp, accepting a trailing 'Z' for UTC."""
+    if not _ISO_NATIVE_Z and value.endswith("Z"):
+        value = value[:-1] + "+00:00"
+    return datetime.fromisoformat(value)
+
 class Config:
     def __init__(self):
         self.config_path = Path.home() / ".prism" / "config.yaml"
@@ -37,6 +55,9 @@ class Config:
         # License cache (1 hour TTL)
         self._license_cache: Optional[dict] = None
         self._cache_ttl = 3600  # 1 hour
+
+        # Parsed credentials.yaml, keyed by (mtime_ns, size) of the file
+        self._credentials_cache: Optional[tuple] = None
         
         # Defaults
         self.settings = {
@@ -47,6 +68,7 @@ class Config:
             "default_db": str(self.data_dir / "prism.db"),
             "device": "auto",  # auto, cuda, mps, cpu
             "developer_mode": False,  # Enable advanced diagnostics (benchmarks)
+            "index_batch_size": None,  # None = engine default for the device
             "video": {
                 "enabled": True,
                 "frames_per_second": 1.0,
@@ -54,7 +76,8 @@ class Config:
             },
             "models": {
                 "yolo": "yolov8m.pt",
-                "siglip": "google/siglip-so400m-patch14-384"
+                "siglip": "google/siglip-so400m-patch14-384",
+                "int8": False  # INT8 SigLIP on CUDA (bitsandbytes) / CPU
             }
         }
         
@@ -64,13 +87,13 @@ class Config:
     def load(self):
         if self.config_path.exists():
             with open(self.config_path, "r") as f:
-                user_settings = yaml.safe_load(f)
+                user_settings = yaml.load(f, Loader=YamlLoader)
                 if user_settings:
                     self.settings.update(user_settings)
 
     def save(self):
         with open(self.config_path, "w") as f:
-            yaml.safe_dump(self.settings, f)
+            yaml.dump(self.settings, f, Dumper=YamlDumper)
 
     @property
     def config_dir(self) -> Path: # Added config_dir property for consistency with credentials path
@@ -79,14 +102,24 @@ class Config:
     def load_credentials(self) -> dict:
         """Load credentials from separate secure file."""
         creds_path = self.config_dir / "credentials.yaml"
-        if not creds_path.exists():
+        try:
+            st = os.stat(creds_path)
+        except OSError:
             return {}
+
+        # Cloud loaders read credentials per file; only re-parse when the file changes
+        key = (st.st_mtime_ns, st.st_size)
+        if self._credentials_cache and self._credentials_cache[0] == key:
+            return copy.deepcopy(self._credentials_cache[1])
+
         try:
             with open(creds_path, "r") as f:
-                return yaml.safe_load(f) or {}
+                creds = yaml.load(f, Loader=YamlLoader) or {}
         except Exception as e:
             logger.error(f"Failed to load credentials: {e}")
             return {}
+        self._credentials_cache = (key, creds)
+        return copy.deepcopy(creds)
 
     def save_credentials(self, creds: dict):
         """Save credentials securely."""
@@ -98,10 +131,11 @@ class Config:
                 os.chmod(creds_path, 0o600)
             
             with open(creds_path, "w") as f:
-                yaml.safe_dump(creds, f)
+                yaml.dump(creds, f, Dumper=YamlDumper)
             
             # Update permissions again just in case
             os.chmod(creds_path, 0o600)
+            self._credentials_cache = None
         except Exception as e:
             logger.error(f"Failed to save credentials: {e}")
 
@@ -242,13 +276,11 @@ class Config:
             expires_at = data.get("expires_at", "")
             if expires_at:
                 try:
-                    # Handle both Z and +00:00 formats
-                    dt_str = expires_at.replace("Z", "+00:00")
                     # Skip invalid/far-future dates (year > 9999)
-                    if dt_str.startswith("+") or len(dt_str.split("-")[0]) > 4:
+                    if expires_at.startswith("+") or len(expires_at.split("-")[0]) > 4:
                         logger.info("License has far-future expiration, treating as valid.")
                     else:
-                        dt = datetime.fromisoformat(dt_str)
+                        dt = parse_iso_datetime(expires_at)
                         if datetime.now(dt.tzinfo) > dt:
                              logger.warning("Cached license expired.")
                              return {}
@@ -294,8 +326,7 @@ class Config:
             expires = self._license_cache.get("expires_at")
             if expires:
                 try:
-                    dt_str = expires.replace("Z", "+00:00")
-                    dt = datetime.fromisoformat(dt_str)
+                    dt = parse_iso_datetime(expires)
                     if datetime.now(dt.tzinfo) < dt:
                         logger.info("Using valid offline license.")
                         return self._license_cache
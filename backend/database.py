@@ -1,24 +1,58 @@
 import sqlite3
 import json
 import hashlib
+import os
+import struct
+import tempfile
+import threading
 from datetime import datetime
 from contextlib import contextmanager
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Tuple
 
 class Database:
     def __init__(self, db_path="prism.db"):
         self.db_path = db_path
+        # sqlite3 connections are bound to their thread, so each thread keeps one
+        self._local = threading.local()
+        # Serializes vector file appends, rebuilds and loads (concurrent Searches after an
+        # invalidation); reentrant so vector_files() can hold it around a rebuild
+        self._vector_lock = threading.RLock()
         self.init_db()
 
+    def _connect(self) -> sqlite3.Connection:
+        """Return this thread's connection, opening and tuning it on first use."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path)
+            conn.row_factory = sqlite3.Row  # Enable dict-like access
+            # WAL lets searches read while Index writes; NORMAL skips the fsync per commit
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA temp_store=MEMORY")
+            conn.execute("PRAGMA mmap_size=268435456")
+            self._local.conn = conn
+        return conn
+
     @contextmanager
     def _get_connection(self):
-        """Context manager for database connections with proper cleanup."""
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row  # Enable dict-like access
+        """
+        Context manager yielding this thread's reused connection. Reuse keeps
+        sqlite3's per-connection prepared-statement cache warm across calls.
+        """
+        conn = self._connect()
         try:
             yield conn
         finally:
+            # Never leave a transaction open on a shared connection
+            if conn.in_transaction:
+                conn.rollback()
+
+    def close(self):
+        """Close the calling thread's connection."""
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
             conn.close()
+            self._local.conn = None
 
     def init_db(self):
         with self._get_connection() as conn:
@@ -62,6 +96,11 @@ class Database:
             except sqlite3.OperationalError:
                 pass  # Column already exists
             
+            try:
+                cursor.execute('ALTER TABLE frames ADD COLUMN size_bytes INTEGER')
+            except sqlite3.OperationalError:
+                pass  # Column already exists
+            
             # Create indexes for faster queries (after migrations)
             cursor.execute('CREATE INDEX IF NOT EXISTS idx_frames_path ON frames(frame_path)')
             cursor.execute('CREATE INDEX IF NOT EXISTS idx_frames_hash ON frames(file_hash)')
@@ -96,6 +135,33 @@ class Database:
             cursor.execute("SELECT 1 FROM frames WHERE file_hash = ? LIMIT 1", (file_hash,))
             return cursor.fetchone() is not None
 
+    def get_existing_hashes(self, file_hashes: List[str]) -> set:
+        """Return the subset of file_hashes already indexed, using one connection."""
+        unique = list({h for h in file_hashes if h})
+        if not unique:
+            return set()
+        with self._get_connection() as conn:
+            rows = self._chunked_in_query(
+                conn.cursor(),
+                "SELECT DISTINCT file_hash FROM frames WHERE file_hash IN ({placeholders})",
+                unique
+            )
+        return {row[0] for row in rows}
+
+    @staticmethod
+    def _chunked_in_query(cursor, sql: str, values: list) -> list:
+        """
+        Run `sql` once per chunk of `values` and return all rows. `sql` has a
+        single {placeholders} slot for the IN list; chunks of 500 stay under
+        SQLite's default limit of 999 bound parameters.
+        """
+        rows = []
+        for start in range(0, len(values), 500):
+            chunk = values[start:start + 500]
+            cursor.execute(sql.format(placeholders=",".join("?" * len(chunk))), chunk)
+            rows.extend(cursor.fetchall())
+        return rows
+
     def file_exists_by_path(self, file_path: str) -> bool:
         """Check if a file with given path already exists."""
         with self._get_connection() as conn:
@@ -114,7 +180,8 @@ class Database:
         return 'local'
 
     def save_frame_and_embeddings(self, file_path: str, width: int, height: int, 
-                                   embeddings_list: List[Dict], file_hash: Optional[str] = None):
+                                   embeddings_list: List[Dict], file_hash: Optional[str] = None,
+                                   size_bytes: Optional[int] = None):
         """
         Saves frame metadata and its associated embeddings.
         embeddings_list: list of dicts {type, class, bbox, embedding}
@@ -129,9 +196,9 @@ class Database:
                 # Insert Frame with hash and source type
                 cursor.execute(
                     """INSERT OR REPLACE INTO frames 
-                       (frame_path, file_hash, source_type, width, height, indexed_at) 
-                       VALUES (?, ?, ?, ?, ?, ?)""",
-                    (file_path, file_hash, source_type, width, height, now)
+                       (frame_path, file_hash, source_type, width, height, indexed_at, size_bytes) 
+                       VALUES (?, ?, ?, ?, ?, ?, ?)""",
+                    (file_path, file_hash, source_type, width, height, now, size_bytes)
                 )
                 frame_id = cursor.lastrowid
                 
@@ -144,6 +211,7 @@ class Database:
                         cursor.execute("DELETE FROM embeddings WHERE frame_id = ?", (frame_id,))
 
                 # Insert Embeddings
+                new_vectors = []
                 for item in embeddings_list:
                     vector_blob = item['embedding'].tobytes()
                     bbox_json = json.dumps(item.get('bbox')) if item.get('bbox') else None
@@ -154,22 +222,29 @@ class Database:
                            VALUES (?, ?, ?, ?, ?)''',
                         (frame_id, item['type'], item.get('class'), bbox_json, vector_blob)
                     )
+                    new_vectors.append((cursor.lastrowid, vector_blob))
                     
                 conn.commit()
             except Exception as e:
                 conn.rollback()
                 raise e
+        
+        self._append_vectors(new_vectors)
 
     def batch_save_frames(self, frames_data: List[Dict]):
         """
         Efficiently save multiple frames in a single transaction.
-        frames_data: list of dicts with {path, width, height, embeddings, file_hash}
+        frames_data: list of dicts with {path, width, height, embeddings, file_hash, size_bytes}
         """
+        if not frames_data:
+            return
+
         with self._get_connection() as conn:
             cursor = conn.cursor()
             
             try:
                 now = datetime.now().isoformat()
+                embedding_rows = []
                 
                 for frame in frames_data:
                     file_path = frame['path']
@@ -177,10 +252,10 @@ class Database:
                     
                     cursor.execute(
                         """INSERT OR REPLACE INTO frames 
-                           (frame_path, file_hash, source_type, width, height, indexed_at) 
-                           VALUES (?, ?, ?, ?, ?, ?)""",
+                           (frame_path, file_hash, source_type, width, height, indexed_at, size_bytes) 
+                           VALUES (?, ?, ?, ?, ?, ?, ?)""",
                         (file_path, frame.get('file_hash'), source_type, 
-                         frame['width'], frame['height'], now)
+                         frame['width'], frame['height'], now, frame.get('size_bytes'))
                     )
                     frame_id = cursor.lastrowid
                     
@@ -192,20 +267,31 @@ class Database:
                             cursor.execute("DELETE FROM embeddings WHERE frame_id = ?", (frame_id,))
                     
                     for item in frame.get('embeddings', []):
-                        vector_blob = item['embedding'].tobytes()
                         bbox_json = json.dumps(item.get('bbox')) if item.get('bbox') else None
-                        
-                        cursor.execute(
-                            '''INSERT INTO embeddings 
-                               (frame_id, embedding_type, object_class, bbox, vector) 
-                               VALUES (?, ?, ?, ?, ?)''',
-                            (frame_id, item['type'], item.get('class'), bbox_json, vector_blob)
+                        embedding_rows.append(
+                            (frame_id, item['type'], item.get('class'), bbox_json, item['embedding'].tobytes())
                         )
                 
+                # AUTOINCREMENT ids follow sqlite_sequence, and this transaction already
+                # holds the write lock, so the ids executemany assigns are known up front
+                cursor.execute("SELECT seq FROM sqlite_sequence WHERE name = 'embeddings'")
+                row = cursor.fetchone()
+                first_id = (row[0] if row else 0) + 1
+                
+                cursor.executemany(
+                    '''INSERT INTO embeddings 
+                       (frame_id, embedding_type, object_class, bbox, vector) 
+                       VALUES (?, ?, ?, ?, ?)''',
+                    embedding_rows
+                )
+                new_vectors = [(first_id + i, r[4]) for i, r in enumerate(embedding_rows)]
+                
                 conn.commit()
             except Exception as e:
                 conn.rollback()
                 raise e
+        
+        self._append_vectors(new_vectors)
 
     def get_column_vectors(self):
         """Returns all embedding vectors with their IDs."""
@@ -214,6 +300,102 @@ class Database:
             cursor.execute("SELECT id, vector FROM embeddings")
             return cursor.fetchall()
 
+    def _vector_file_paths(self, dim: int) -> Tuple[str, str]:
+        """Paths of the contiguous float32 vector file and its uint64 id file for `dim`-d vectors."""
+        base = f"{self.db_path}.vec{dim}"
+        return f"{base}.f32", f"{base}.ids"
+
+    def _vector_files_in_sync(self, dim: int, count: int, max_id: Optional[int]) -> bool:
+        """Check the vector files hold exactly the `count` rows ending at `max_id`."""
+        vec_path, ids_path = self._vector_file_paths(dim)
+        try:
+            if os.path.getsize(ids_path) != count * 8 or os.path.getsize(vec_path) != count * dim * 4:
+                return False
+            if count == 0:
+                return True
+            with open(ids_path, "rb") as f:
+                f.seek(-8, os.SEEK_END)
+                return struct.unpack("<Q", f.read(8))[0] == max_id
+        except OSError:
+            return False
+
+    def _append_vectors(self, rows: List[Tuple[int, bytes]]):
+        """
+        Append newly inserted (embedding_id, vector_blob) rows to existing vector files.
+        Files that don't exist yet are built on the next get_vectors_mmap_path call.
+        """
+        by_dim = {}
+        for pk, blob in rows:
+            by_dim.setdefault(len(blob) // 4, []).append((pk, blob))
+        
+        with self._vector_lock:
+            for dim, dim_rows in by_dim.items():
+                vec_path, ids_path = self._vector_file_paths(dim)
+                if not os.path.exists(vec_path):
+                    continue
+                with open(vec_path, "ab") as vf, open(ids_path, "ab") as idf:
+                    vf.write(b"".join(blob for _, blob in dim_rows))
+                    idf.write(struct.pack(f"<{len(dim_rows)}Q", *(pk for pk, _ in dim_rows)))
+
+    def get_vectors_mmap_path(self, dim: int) -> Tuple[str, str]:
+        """
+        Returns (vectors_path, ids_path) for all `dim`-d embeddings, suitable for np.memmap.
+        vectors_path holds N*dim float32 values back to back; ids_path holds the N
+        embedding IDs as little-endian uint64. The files are rebuilt from SQLite
+        whenever they have drifted (replaced frames, deletes, vacuum).
+        """
+        vec_path, ids_path = self._vector_file_paths(dim)
+        directory = os.path.dirname(os.path.abspath(vec_path))
+        
+        with self._vector_lock:
+            with self._get_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute(
+                    "SELECT COUNT(*), MAX(id) FROM embeddings WHERE length(vector) = ?",
+                    (dim * 4,)
+                )
+                count, max_id = cursor.fetchone()
+                if self._vector_files_in_sync(dim, count, max_id):
+                    return vec_path, ids_path
+                
+                # Rebuild into temp files, then swap in atomically (open memmaps keep the old inode).
+                # Temp names are unique so another process rebuilding the same files can't collide.
+                cursor.execute(
+                    "SELECT id, vector FROM embeddings WHERE length(vector) = ? ORDER BY id",
+                    (dim * 4,)
+                )
+                vec_fd, vec_tmp = tempfile.mkstemp(dir=directory, suffix=".f32.tmp")
+                ids_fd, ids_tmp = tempfile.mkstemp(dir=directory, suffix=".ids.tmp")
+                try:
+                    ids = []
+                    with os.fdopen(vec_fd, "wb") as vf:
+                        for pk, blob in cursor:
+                            vf.write(blob)
+                            ids.append(pk)
+                    with os.fdopen(ids_fd, "wb") as idf:
+                        idf.write(struct.pack(f"<{len(ids)}Q", *ids))
+                    
+                    # Readers size the vector memmap from the ids file, so it goes first.
+                    # In-process readers hold the lock via vector_files() and never see a half swap.
+                    os.replace(ids_tmp, ids_path)
+                    os.replace(vec_tmp, vec_path)
+                except BaseException:
+                    for tmp in (vec_tmp, ids_tmp):
+                        if os.path.exists(tmp):
+                            os.unlink(tmp)
+                    raise
+        return vec_path, ids_path
+
+    @contextmanager
+    def vector_files(self, dim: int):
+        """
+        Context manager yielding get_vectors_mmap_path(dim) with the vector lock held,
+        so the caller can open both files as one consistent pair before another
+        thread appends to or rebuilds them.
+        """
+        with self._vector_lock:
+            yield self.get_vectors_mmap_path(dim)
+
     def get_metadata_by_ids(self, embedding_ids: List[int]) -> Dict[int, Dict]:
         """Returns full metadata for the specified embedding IDs."""
         if not embedding_ids:
@@ -226,7 +408,7 @@ class Database:
             placeholders = ','.join('?' * len(embedding_ids))
             query = f'''
                 SELECT e.id, f.frame_path, e.embedding_type, e.object_class, e.bbox, 
-                       f.width, f.height, f.indexed_at, f.source_type
+                       f.width, f.height, f.indexed_at, f.source_type, f.size_bytes
                 FROM embeddings e
                 JOIN frames f ON e.frame_id = f.id
                 WHERE e.id IN ({placeholders})
@@ -246,7 +428,8 @@ class Database:
                 "width": r[5],
                 "height": r[6],
                 "indexed_at": r[7],
-                "source_type": r[8] if len(r) > 8 else "local"
+                "source_type": r[8] if len(r) > 8 else "local",
+                "size_bytes": r[9] if len(r) > 9 else None
             }
         
         return results
@@ -263,6 +446,23 @@ class Database:
             ''', (frame_path,))
             return [row[0] for row in cursor.fetchall()]
 
+    def get_objects_for_frames(self, frame_paths: List[str]) -> Dict[str, List[str]]:
+        """Get detected object classes for many frames at once, keyed by frame path."""
+        objects = {}
+        unique = list(dict.fromkeys(frame_paths))
+        if not unique:
+            return objects
+        with self._get_connection() as conn:
+            rows = self._chunked_in_query(conn.cursor(), '''
+                SELECT DISTINCT f.frame_path, e.object_class
+                FROM embeddings e
+                JOIN frames f ON e.frame_id = f.id
+                WHERE f.frame_path IN ({placeholders}) AND e.object_class IS NOT NULL
+            ''', unique)
+        for frame_path, object_class in rows:
+            objects.setdefault(frame_path, []).append(object_class)
+        return objects
+
     def get_stats(self) -> Dict[str, Any]:
         with self._get_connection() as conn:
             cursor = conn.cursor()
@@ -1,11 +1,15 @@
 import os
 import logging
-from typing import Generator, Union, Tuple
+from typing import Generator, List, Union, Tuple
 from plugins import IngestionSource, plugin_manager
+from pipeline_utils import fan_in
 from video_utils import extract_frames
 
 logger = logging.getLogger(__name__)
 
+# Videos decoded at once; OpenCV releases the GIL while seeking and decoding
+VIDEO_WORKERS = min(4, os.cpu_count() or 1)
+
 
 class LocalFileIngestor(IngestionSource):
     @property
@@ -31,36 +35,77 @@ class LocalFileIngestor(IngestionSource):
         image_extensions = {'.jpg', '.jpeg', '.png', '.bmp', '.gif', '.webp'}
         video_extensions = {'.mp4', '.avi', '.mov', '.mkv', '.webm', '.m4v'}
         count = 0
+        video_paths = []
         
-        for root, dirs, files in os.walk(root_path):
-            for file in files:
-                ext = os.path.splitext(file)[1].lower()
-                full_path = os.path.join(root, file)
-                
-                if ext in image_extensions:
-                    # Standard image file
-                    yield full_path
-                    count += 1
-                    if max_files > 0 and count >= max_files:
+        for name, full_path in self._walk_files(root_path):
+            ext = os.path.splitext(name)[1].lower()
+            
+            if ext in image_extensions:
+                # Standard image file
+                yield full_path
+                count += 1
+                if max_files > 0 and count >= max_files:
+                    return
+                    
+            elif ext in video_extensions:
+                # Video file - frames are extracted once the walk is done
+                video_paths.append(full_path)
+
+        for frame in self._extract_video_frames(video_paths):
+            # Yield video frame as tuple for special handling
+            yield frame
+            count += 1
+            if max_files > 0 and count >= max_files:
+                return
+
+    def _walk_files(self, root_path: str) -> Generator[Tuple[str, str], None, None]:
+        """
+        Yield (name, path) for every non-directory entry under root_path.
+
+        Uses an explicit os.scandir stack: the DirEntry type comes from the
+        directory read itself, so no per-file stat is issued. Like os.walk,
+        symlinked directories are not followed and unreadable ones are skipped.
+        """
+        stack = [root_path]
+        while stack:
+            directory = stack.pop()
+            try:
+                with os.scandir(directory) as entries:
+                    for entry in entries:
+                        try:
+                            is_dir = entry.is_dir(follow_symlinks=False)
+                        except OSError:
+                            continue
+                        if is_dir:
+                            stack.append(entry.path)
+                        else:
+                            yield entry.name, entry.path
+            except OSError as e:
+                logger.warning(f"Skipping unreadable directory {directory}: {e}")
+
+    def _extract_video_frames(self, video_paths: List[str]) -> Generator[Tuple[str, object], None, None]:
+        """
+        Extract frames from several videos concurrently.
+
+        Frames are handed over through a bounded queue, so memory stays flat
+        no matter how many videos are decoding. Yields (virtual_path, pil_image)
+        in completion order.
+        """
+        def extract(video_path, emit):
+            logger.info(f"Extracting frames from video: {os.path.basename(video_path)}")
+            try:
+                for pil_image, timestamp, virtual_path in extract_frames(
+                    video_path,
+                    fps=1.0,
+                    max_frames=300
+                ):
+                    if not emit((virtual_path, pil_image)):
                         return
-                        
-                elif ext in video_extensions:
-                    # Video file - extract frames
-                    logger.info(f"Extracting frames from video: {file}")
-                    try:
-                        for pil_image, timestamp, virtual_path in extract_frames(
-                            full_path,
-                            fps=1.0,
-                            max_frames=300
-                        ):
-                            # Yield video frame as tuple for special handling
-                            yield (virtual_path, pil_image)
-                            count += 1
-                            if max_files > 0 and count >= max_files:
-                                return
-                    except Exception as e:
-                        logger.error(f"Failed to extract frames from {file}: {e}")
+            except Exception as e:
+                logger.error(f"Failed to extract frames from {os.path.basename(video_path)}: {e}")
 
+        # Stopping early (max_files, cancelled Index) cancels videos not yet opened
+        yield from fan_in(extract, video_paths, max_workers=VIDEO_WORKERS, maxsize=VIDEO_WORKERS * 8)
 
 def register():
     """Register this plugin."""
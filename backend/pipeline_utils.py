@@ -0,0 +1,88 @@
+"""
+Threading Utilities for Prism Pipelines
+
+Discovery and indexing hand work between threads through bounded queues, so
+a slow consumer applies backpressure upstream. These helpers keep the stop
+handling in one place: producers give up as soon as the consumer goes away,
+and queued work that hasn't started is cancelled instead of run.
+"""
+
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Generator, Iterable
+
+# How often blocked producers and consumers re-check for shutdown (seconds)
+POLL_INTERVAL = 0.1
+
+
+def put_until_stopped(q: queue.Queue, item: Any, stop: threading.Event) -> bool:
+    """
+    Put an item on a bounded queue, waiting while it is full.
+
+    Returns:
+        True once the item is queued, False if `stop` was set first
+    """
+    while not stop.is_set():
+        try:
+            q.put(item, timeout=POLL_INTERVAL)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def fan_in(
+    work: Callable[[Any, Callable[[Any], bool]], None],
+    tasks: Iterable[Any],
+    max_workers: int,
+    maxsize: int
+) -> Generator[Any, None, None]:
+    """
+    Run work(task, emit) for every task on a thread pool and yield whatever
+    the workers emit, in completion order.
+
+    emit(item) blocks while `maxsize` items are waiting and returns False once
+    the consumer has stopped; work should return as soon as it does. Closing
+    the generator early cancels tasks that haven't started and waits for the
+    running ones to reach their next emit. After a full drain, the first
+    exception raised by a task is re-raised.
+
+    Args:
+        work: Callable run once per task with (task, emit)
+        tasks: Inputs to fan out
+        max_workers: Upper bound on concurrent tasks
+        maxsize: Bound of the hand-off queue
+    """
+    tasks = list(tasks)
+    if not tasks:
+        return
+
+    items = queue.Queue(maxsize=maxsize)
+    stop = threading.Event()
+
+    def emit(item) -> bool:
+        return put_until_stopped(items, item, stop)
+
+    def run(task):
+        # A task can be picked up between stop.set() and the cancel below
+        if stop.is_set():
+            return
+        work(task, emit)
+
+    executor = ThreadPoolExecutor(max_workers=min(max_workers, len(tasks)))
+    try:
+        futures = [executor.submit(run, task) for task in tasks]
+        while True:
+            try:
+                yield items.get(timeout=POLL_INTERVAL)
+            except queue.Empty:
+                # A finished worker has already queued everything it emitted
+                if all(f.done() for f in futures) and items.empty():
+                    break
+
+        for f in futures:
+            f.result()
+    finally:
+        stop.set()
+        executor.shutdown(wait=True, cancel_futures=True)
@@ -1,11 +1,17 @@
 import logging
 import boto3
-from typing import Generator
+from typing import Generator, List
 from plugins import IngestionSource
 from config import config
+from pipeline_utils import fan_in
 
 logger = logging.getLogger(__name__)
 
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.webp', '.bmp', '.tiff')
+
+# Sub-prefixes listed concurrently; LIST requests are network-bound
+LIST_WORKERS = 16
+
 class S3IngestionSource(IngestionSource):
     @property
     def name(self) -> str:
@@ -32,8 +38,25 @@ class S3IngestionSource(IngestionSource):
             region_name=creds.get('region')
         )
 
+    def _image_keys(self, page: dict) -> List[str]:
+        """Image object keys from one list_objects_v2 page."""
+        keys = []
+        for obj in page.get('Contents', []):
+            key = obj['Key']
+            if key.endswith('/'):  # Skip directory markers
+                continue
+            if key.lower().endswith(IMAGE_EXTENSIONS):
+                keys.append(key)
+        return keys
+
     def discover_files(self, path: str, max_files: int = 0) -> Generator[str, None, None]:
-        """List objects in S3 bucket."""
+        """
+        List image objects under an S3 prefix.
+
+        The first level is listed with Delimiter='/'; each sub-prefix found there
+        then gets its own paginator on a thread pool, so deep prefix trees
+        (daily/hourly partitions) are listed in parallel instead of serially.
+        """
         try:
             s3 = self._get_client()
             
@@ -44,24 +67,34 @@ class S3IngestionSource(IngestionSource):
             prefix = parts[1] if len(parts) > 1 else ""
 
             paginator = s3.get_paginator('list_objects_v2')
-            page_iterator = paginator.paginate(Bucket=bucket, Prefix=prefix)
-
             count = 0
-            for page in page_iterator:
-                if 'Contents' not in page:
-                    continue
-                    
-                for obj in page['Contents']:
-                    key = obj['Key']
-                    if key.endswith(('/', '')): # Skip directories
-                        continue
-                        
-                    # Filter for images
-                    if key.lower().endswith(('.jpg', '.jpeg', '.png', '.webp', '.bmp', '.tiff')):
-                        yield f"s3://{bucket}/{key}"
-                        count += 1
-                        if max_files > 0 and count >= max_files:
-                            return
+            sub_prefixes = []
+
+            for page in paginator.paginate(Bucket=bucket, Prefix=prefix, Delimiter='/'):
+                sub_prefixes.extend(p['Prefix'] for p in page.get('CommonPrefixes', []))
+                for key in self._image_keys(page):
+                    yield f"s3://{bucket}/{key}"
+                    count += 1
+                    if max_files > 0 and count >= max_files:
+                        return
+
+            if not sub_prefixes:
+                return
+
+            def list_prefix(sub_prefix, emit):
+                # Paginators are not shared across threads; the client is thread-safe
+                for page in s3.get_paginator('list_objects_v2').paginate(Bucket=bucket, Prefix=sub_prefix):
+                    if not emit(self._image_keys(page)):
+                        return
+
+            # Stopping early (max_files, consumer closed) cancels prefixes not yet listed;
+            # the first listing failure, if any, is raised once all pages are drained
+            for keys in fan_in(list_prefix, sub_prefixes, max_workers=LIST_WORKERS, maxsize=LIST_WORKERS * 2):
+                for key in keys:
+                    yield f"s3://{bucket}/{key}"
+                    count += 1
+                    if max_files > 0 and count >= max_files:
+                        return
 
         except Exception as e:
             logger.error(f"S3 discovery failed: {e}")
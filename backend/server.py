@@ -5,8 +5,14 @@ import sys
 import subprocess
 import platform
 import logging
+import tempfile
 import time
 
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
 
 # Add current directory to path so imports work if running from backend/
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
@@ -48,11 +54,41 @@ except ImportError:
 
 plugin_manager.load_plugins()
 
+def _to_proto_metric(m: dict):
+    return prism_pb2.BenchmarkMetric(
+        name=m.get("name", ""),
+        value=m.get("value", 0.0),
+        unit=m.get("unit", ""),
+        context=m.get("context", "")
+    )
+
+# Windows folder picker. The prompt is passed as an argument rather than
+# spliced into the script, so the file is written once and reused per call.
+FOLDER_PICKER_PS1 = """param([string]$Prompt)
+[void][System.Reflection.Assembly]::LoadWithPartialName('System.Windows.Forms')
+$objForm = New-Object System.Windows.Forms.FolderBrowserDialog
+$objForm.Description = $Prompt
+if ($objForm.ShowDialog() -eq 'OK') { $objForm.SelectedPath }
+"""
+
 class PrismServicer(prism_pb2_grpc.PrismServiceServicer):
+    # GetSystemInfo cache lifetimes (seconds). License lookups can hit the
+    # network when the cached validation is stale, so they are kept longer.
+    MEM_USAGE_TTL = 0.5
+    LICENSE_INFO_TTL = 60.0
+
     def __init__(self):
         self.db = Database()
-        self.engine = LocalSearchEngine()
+        self.engine = LocalSearchEngine(use_int8=config.settings.get("models", {}).get("int8", False))
         self.benchmarker = Benchmarker(self.engine, self.db)
+        
+        # GetSystemInfo is polled by the UI: constant fields are read once,
+        # volatile ones are cached briefly as (monotonic_time, value)
+        self._cpu_count = os.cpu_count()
+        self._mem_usage_cache = (0.0, None)
+        self._license_info_cache = (0.0, None)
+        self._folder_picker_path = None
+        self._benchmark_proto_cache = (None, None)
 
     def Index(self, request, context):
         root_path = request.path
@@ -79,67 +115,69 @@ class PrismServicer(prism_pb2_grpc.PrismServiceServicer):
         logger.info(f"Using ingestor: {ingestor.name} for {root_path}")
 
         # 2. Discovery Phase - No limits, all features free
-        files_to_process = []
-        
-        try:
-             for f in ingestor.discover_files(root_path, max_files=1_000_000):
-                 files_to_process.append(f)
-        except Exception as e:
-            logger.error(f"Discovery failed: {e}")
-            context.set_code(grpc.StatusCode.INTERNAL)
-            context.set_details(f"Discovery failed: {str(e)}")
-            return
+        # Paths stream straight into the batch pipeline; nothing holds the full list
+        discovery = {"count": 0, "done": False, "error": None}
 
-        total_files = len(files_to_process)
-
-        if total_files == 0:
-            context.set_code(grpc.StatusCode.NOT_FOUND)
-            context.set_details(f"[PSM-4002] No images found in: {root_path}")
-            return
-
-        logger.info(f"Processing {total_files} images from {root_path}")
+        def discover():
+            try:
+                for f in ingestor.discover_files(root_path, max_files=1_000_000):
+                    discovery["count"] += 1
+                    yield f
+                discovery["done"] = True
+            except Exception as e:
+                logger.error(f"Discovery failed: {e}")
+                discovery["error"] = e
 
         # 3. Batch Processing phase with deduplication tracking
-        # Use engine's optimal batch size for the device (8-32)
-        BATCH_SIZE = self.engine.optimal_batch_size
-        logger.info(f"Using batch size: {BATCH_SIZE} for {self.engine.device}")
+        # Configured size, else the engine's size for the device (8-64)
+        configured = config.settings.get("index_batch_size")
+        if configured is not None and (isinstance(configured, bool) or not isinstance(configured, int) or configured <= 0):
+            logger.warning(f"Ignoring index_batch_size={configured!r}: expected a positive integer")
+            configured = None
         
         processed_count = 0
         skipped_count = 0
         error_count = 0
+        batches = None
         
-        for i in range(0, len(files_to_process), BATCH_SIZE):
-            batch_files = files_to_process[i : i + BATCH_SIZE]
+        # Search caches are dropped once at the end (or on cancel), not after every batch
+        try:
+            # Sizing on CUDA loads the models, so it sits inside the error handling too
+            BATCH_SIZE = configured or self.engine.optimal_batch_size
+            if BATCH_SIZE >= 8:
+                BATCH_SIZE -= BATCH_SIZE % 8  # Tensor-core friendly multiples of 8
+            logger.info(f"Processing images from {root_path} with batch size {BATCH_SIZE} on {self.engine.device}")
             
-            try:
-                # Pass db for deduplication checks
-                batch_results = self.engine.process_batch(batch_files, db_connection=self.db)
-                
-                for res in batch_results:
-                    if res.get('skipped', False):
-                        skipped_count += 1
-                        reason = res.get('reason', 'unknown')
-                        if reason == 'duplicate':
-                            status_msg = f"Skipped (duplicate): {os.path.basename(res['path'])}"
+            # Pass db for deduplication checks; the next batch decodes while this one runs
+            batches = self.engine.process_batches(discover(), db_connection=self.db, batch_size=BATCH_SIZE)
+            
+            for _, batch_results in batches:
+                try:
+                    # Persist the whole batch in one transaction before reporting it
+                    self.db.batch_save_frames([res for res in batch_results if not res.get('skipped', False)])
+                    
+                    # One progress message per batch: per-file stream writes cost more than the DB work
+                    for res in batch_results:
+                        if res.get('skipped', False):
+                            skipped_count += 1
+                            reason = res.get('reason', 'unknown')
+                            if reason == 'duplicate':
+                                status_msg = f"Skipped (duplicate): {os.path.basename(res['path'])}"
+                            else:
+                                error_count += 1
+                                status_msg = f"Error: {os.path.basename(res['path'])}"
                         else:
-                            error_count += 1
-                            status_msg = f"Error: {os.path.basename(res['path'])}"
-                    else:
-                        # Save to database with file hash
-                        self.db.save_frame_and_embeddings(
-                            res["path"], 
-                            res["width"], 
-                            res["height"], 
-                            res["embeddings"],
-                            file_hash=res.get("file_hash")
-                        )
-                        status_msg = f"Indexed: {os.path.basename(res['path'])}"
+                            status_msg = f"Indexed: {os.path.basename(res['path'])}"
+                        
+                        processed_count += 1
                     
-                    processed_count += 1
+                    if not batch_results:
+                        continue
                     
-                    # Calculate ETA
+                    # Total is a running count until discovery finishes; only then is an ETA meaningful
+                    total_files = discovery["count"]
                     elapsed = time.time() - start_time
-                    if processed_count > 0:
+                    if discovery["done"] and processed_count > 0:
                         eta_seconds = int((elapsed / processed_count) * (total_files - processed_count))
                     else:
                         eta_seconds = 0
@@ -151,19 +189,42 @@ class PrismServicer(prism_pb2_grpc.PrismServiceServicer):
                         skipped=skipped_count,
                         eta_seconds=eta_seconds
                     )
-                
-                self.engine.invalidate_cache()
 
-            except Exception as e:
-                logger.error(f"Batch processing failed: {e}")
-                error_count += 1
-                yield prism_pb2.IndexProgress(
-                    current=processed_count,
-                    total=total_files,
-                    status_message=f"Batch Error: {str(e)}",
-                    skipped=skipped_count
-                )
+                except Exception as e:
+                    logger.error(f"Batch processing failed: {e}")
+                    error_count += 1
+                    yield prism_pb2.IndexProgress(
+                        current=processed_count,
+                        total=discovery["count"],
+                        status_message=f"Batch Error: {str(e)}",
+                        skipped=skipped_count
+                    )
+        except Exception as e:
+            # Model loading or the pipeline itself failed; nothing more will come out of it
+            logger.error(f"Indexing failed: {e}")
+            yield prism_pb2.IndexProgress(
+                current=processed_count,
+                total=discovery["count"],
+                status_message=f"Batch Error: {str(e)}",
+                skipped=skipped_count
+            )
+            return
+        finally:
+            if batches is not None:
+                batches.close()
+            self.engine.invalidate_cache()
         
+        if discovery["error"] is not None:
+            context.set_code(grpc.StatusCode.INTERNAL)
+            context.set_details(f"Discovery failed: {str(discovery['error'])}")
+            return
+
+        total_files = discovery["count"]
+        if total_files == 0:
+            context.set_code(grpc.StatusCode.NOT_FOUND)
+            context.set_details(f"[PSM-4002] No images found in: {root_path}")
+            return
+
         # Final summary
         elapsed_total = time.time() - start_time
         yield prism_pb2.IndexProgress(
@@ -259,6 +320,12 @@ class PrismServicer(prism_pb2_grpc.PrismServiceServicer):
         return prism_pb2.ValidateCloudCredentialsResponse(success=False, message="Unknown provider")
 
 
+    @staticmethod
+    def _format_size(size_bytes: int) -> str:
+        if size_bytes > 1024 * 1024:
+            return f"{size_bytes / (1024 * 1024):.1f} MB"
+        return f"{size_bytes / 1024:.1f} KB"
+
     def Search(self, request, context):
         query = request.query_text
         logger.info(f"Searching for: {query}")
@@ -277,13 +344,17 @@ class PrismServicer(prism_pb2_grpc.PrismServiceServicer):
                 date_mod = res.get('indexed_at', "Unknown")
                 file_size = "Unknown"
                 
-                if os.path.exists(path):
+                # Size is recorded at index time; only older rows fall back to the filesystem
+                size_bytes = res.get('size_bytes')
+                if size_bytes is not None:
+                    file_size = self._format_size(size_bytes)
+                else:
+                    # One stat instead of exists() + getsize(); missing files stay "Unknown"
                     try:
-                        size_bytes = os.path.getsize(path)
-                        file_size = f"{size_bytes / 1024:.1f} KB"
-                        if size_bytes > 1024 * 1024:
-                            file_size = f"{size_bytes / (1024 * 1024):.1f} MB"
-                    except Exception as meta_e:
+                        file_size = self._format_size(os.stat(path).st_size)
+                    except FileNotFoundError:
+                        pass
+                    except OSError as meta_e:
                         logger.warning(f"Metadata extraction failed for {path}: {meta_e}")
 
                 # Include detected objects from the search result
@@ -315,6 +386,17 @@ class PrismServicer(prism_pb2_grpc.PrismServiceServicer):
             context.set_details(str(e))
             return prism_pb2.SearchResponse()
 
+    @staticmethod
+    def _launch_detached(cmd: list):
+        """Start a desktop helper without waiting for it or sharing our stdio."""
+        subprocess.Popen(
+            cmd,
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            start_new_session=True
+        )
+
     def OpenResult(self, request, context):
         file_path = request.file_path
         logger.info(f"Opening file: {file_path}")
@@ -325,12 +407,13 @@ class PrismServicer(prism_pb2_grpc.PrismServiceServicer):
 
             system_platform = platform.system()
             
+            # Launch and return immediately; the handler shouldn't wait for Finder/xdg-open
             if system_platform == 'Darwin':       # macOS
-                subprocess.run(['open', file_path], check=True)
+                self._launch_detached(['open', file_path])
             elif system_platform == 'Windows':    # Windows
                 os.startfile(file_path)
             elif system_platform == 'Linux':      # Linux
-                subprocess.run(['xdg-open', file_path], check=True)
+                self._launch_detached(['xdg-open', file_path])
             else:
                 return prism_pb2.OpenResponse(success=False, message=f"Unsupported platform: {system_platform}")
 
@@ -351,22 +434,33 @@ class PrismServicer(prism_pb2_grpc.PrismServiceServicer):
 
     def GetSystemInfo(self, request, context):
         try:
-            # Gather system info
-            import psutil
-            mem = psutil.virtual_memory()
-            mem_usage = f"{mem.used / (1024**3):.1f}GB / {mem.total / (1024**3):.1f}GB"
+            now = time.monotonic()
+            
+            checked_at, mem_usage = self._mem_usage_cache
+            if mem_usage is None or now - checked_at >= self.MEM_USAGE_TTL:
+                if psutil is not None:
+                    mem = psutil.virtual_memory()
+                    mem_usage = f"{mem.used / (1024**3):.1f}GB / {mem.total / (1024**3):.1f}GB"
+                else:
+                    mem_usage = "Unknown"
+                self._mem_usage_cache = (now, mem_usage)
+            
+            checked_at, license_info = self._license_info_cache
+            if license_info is None or now - checked_at >= self.LICENSE_INFO_TTL:
+                license_info = (config.license_email, config.license_expires)
+                self._license_info_cache = (now, license_info)
             
             return prism_pb2.GetSystemInfoResponse(
                 device=self.engine.device,
                 siglip_model="SigLIP-SO400M (Lazy Loaded)" if self.engine.model is None else "SigLIP-SO400M (Active)",
                 yolo_model="YOLOv8-Medium (Lazy Loaded)" if self.engine.yolo is None else "YOLOv8-Medium (Active)",
                 backend_version="v2.3.1-stable",
-                cpu_count=os.cpu_count(),
+                cpu_count=self._cpu_count,
                 memory_usage=mem_usage,
                 is_pro=config.is_pro,
                 developer_mode=config.settings.get('developer_mode', False),
-                license_email=config.license_email,
-                license_expires=config.license_expires
+                license_email=license_info[0],
+                license_expires=license_info[1]
             )
         except Exception as e:
             logger.error(f"Failed to get system info: {e}")
@@ -391,10 +485,21 @@ class PrismServicer(prism_pb2_grpc.PrismServiceServicer):
         if key.startswith("PRISM-PRO-"):
             config.settings['license_key'] = key
             config.save()
+            self._license_info_cache = (0.0, None)
             return prism_pb2.ActivateLicenseResponse(success=True, message="Prism Pro Activated! Thank you for your support.")
         else:
             return prism_pb2.ActivateLicenseResponse(success=False, message="Invalid license key. Keys start with 'PRISM-PRO-'.")
 
+    def _get_folder_picker_script(self) -> str:
+        """Write the PowerShell picker script on first use and return its path."""
+        if self._folder_picker_path is None or not os.path.exists(self._folder_picker_path):
+            with tempfile.NamedTemporaryFile(
+                "w", prefix="prism_folder_picker_", suffix=".ps1", delete=False
+            ) as f:
+                f.write(FOLDER_PICKER_PS1)
+            self._folder_picker_path = f.name
+        return self._folder_picker_path
+
     def PickFolder(self, request, context):
         logger.info("Opening native folder picker...")
         try:
@@ -406,8 +511,8 @@ class PrismServicer(prism_pb2_grpc.PrismServiceServicer):
                 return prism_pb2.PickFolderResponse(success=True, path=result)
             elif system_platform == 'Windows':
                 # Windows PowerShell
-                ps_cmd = f"[System.Reflection.Assembly]::LoadWithPartialName('System.Windows.Forms'); $objForm = New-Object System.Windows.Forms.FolderBrowserDialog; $objForm.Description = '{request.prompt}'; if($objForm.ShowDialog() -eq 'OK') {{ $objForm.SelectedPath }}"
-                cmd = ["powershell", "-ExecutionPolicy", "Bypass", "-Command", ps_cmd]
+                cmd = ["powershell", "-NoProfile", "-ExecutionPolicy", "Bypass",
+                       "-File", self._get_folder_picker_script(), "-Prompt", request.prompt]
                 result = subprocess.check_output(cmd).decode('utf-8').strip()
                 if result:
                     return prism_pb2.PickFolderResponse(success=True, path=result)
@@ -469,23 +574,22 @@ class PrismServicer(prism_pb2_grpc.PrismServiceServicer):
                 os=""
             )
         
-        def to_proto_metric(m):
-            return prism_pb2.BenchmarkMetric(
-                name=m.get("name", ""),
-                value=m.get("value", 0.0),
-                unit=m.get("unit", ""),
-                context=m.get("context", "")
-            )
+        # Reports don't change once a run finishes: build the proto once per report
+        cached_report, cached_proto = self._benchmark_proto_cache
+        if cached_report is report:
+            return cached_proto
         
-        return prism_pb2.BenchmarkReport(
+        proto = prism_pb2.BenchmarkReport(
             timestamp=report.timestamp,
             prism_version=report.prism_version,
             device=report.device,
             os=report.os,
-            indexing_metrics=[to_proto_metric(m) for m in report.indexing_metrics],
-            search_metrics=[to_proto_metric(m) for m in report.search_metrics],
-            system_metrics=[to_proto_metric(m) for m in report.system_metrics]
+            indexing_metrics=[_to_proto_metric(m) for m in report.indexing_metrics],
+            search_metrics=[_to_proto_metric(m) for m in report.search_metrics],
+            system_metrics=[_to_proto_metric(m) for m in report.system_metrics]
         )
+        self._benchmark_proto_cache = (report, proto)
+        return proto
 
 
 def start_license_checker():
@@ -510,8 +614,13 @@ def start_license_checker():
     thread = threading.Thread(target=check_loop, daemon=True)
     thread.start()
 
+# Index and RunBenchmark hold a handler thread for their whole stream; the pool is
+# sized so a few long streams never starve Search/GetStats of threads
+SERVER_WORKERS = 32
+
+
 def serve():
-    server = grpc.server(futures.ThreadPoolExecutor(max_workers=10))
+    server = grpc.server(futures.ThreadPoolExecutor(max_workers=SERVER_WORKERS, thread_name_prefix="prism-rpc"))
     # We delay adding the servicer until we are sure imports worked, or we handle ImportError above
     # Assuming successful import for runtime:
     try:
@@ -114,6 +114,38 @@ class TestCredentialsManagement:
         result = config.azure_creds
         assert isinstance(result, dict)
 
+    def test_load_credentials_reflects_saves(self):
+        """Cached credentials should be re-read after the file changes."""
+        from config import Config
+        cfg = Config.__new__(Config)
+        cfg._credentials_cache = None
+        with tempfile.TemporaryDirectory() as d:
+            cfg.data_dir = Path(d)
+            cfg.save_credentials({"aws": {"region": "us-east-1"}})
+            creds = cfg.load_credentials()
+            creds["aws"]["region"] = "mutated"
+            assert cfg.aws_creds == {"region": "us-east-1"}
+
+            cfg.save_credentials({"aws": {"region": "eu-west-1"}})
+            assert cfg.aws_creds == {"region": "eu-west-1"}
+
+
+class TestDateParsing:
+    """Test ISO-8601 expiry parsing."""
+
+    def test_parse_iso_datetime_accepts_z(self):
+        """A trailing Z should parse as UTC."""
+        from config import parse_iso_datetime
+        dt = parse_iso_datetime("2027-01-05T15:32:39.942Z")
+        assert dt.utcoffset().total_seconds() == 0
+        assert dt.year == 2027
+
+    def test_parse_iso_datetime_offset(self):
+        """Explicit offsets should be preserved."""
+        from config import parse_iso_datetime
+        dt = parse_iso_datetime("2027-01-05T15:32:39+02:00")
+        assert dt.utcoffset().total_seconds() == 7200
+
 
 class TestSignatureVerification:
     """Test RSA signature verification."""
@@ -25,6 +25,7 @@ class TestDatabaseBasics:
         yield db
         
         # Cleanup
+        db.close()
         os.unlink(db_path)
     
     def test_database_creates(self, temp_db):
@@ -44,6 +45,15 @@ class TestDatabaseBasics:
         assert stats['total_embeddings'] == 0
 
 
+    def test_connection_reused_in_wal_mode(self, temp_db):
+        """Calls on one thread should share a WAL-mode connection."""
+        with temp_db._get_connection() as first:
+            mode = first.execute("PRAGMA journal_mode").fetchone()[0]
+        with temp_db._get_connection() as second:
+            assert second is first
+        assert mode == "wal"
+
+
 class TestFileHashDeduplication:
     """Test file hash and deduplication functionality."""
     
@@ -58,6 +68,7 @@ class TestFileHashDeduplication:
         yield db
         
         # Cleanup
+        db.close()
         os.unlink(db_path)
     
     def test_compute_file_hash_consistent(self, temp_db):
@@ -98,6 +109,16 @@ class TestFileHashDeduplication:
         result = temp_db.file_exists_by_hash("nonexistenthash12345678901234567890")
         assert result is False
     
+    def test_get_existing_hashes_empty(self, temp_db):
+        """Unknown hashes should not be reported as indexed."""
+        assert temp_db.get_existing_hashes(["nonexistent_hash", None]) == set()
+
+    def test_get_existing_hashes_finds_saved(self, temp_db):
+        """Only hashes of saved frames should be returned."""
+        temp_db.save_frame_and_embeddings("/tmp/a.jpg", 10, 10, [], file_hash="hash_a")
+        found = temp_db.get_existing_hashes(["hash_a", "hash_b"])
+        assert found == {"hash_a"}
+
     def test_file_exists_by_path_false(self, temp_db):
         """Non-existent path should return False."""
         result = temp_db.file_exists_by_path("/nonexistent/path/file.jpg")
@@ -118,6 +139,7 @@ class TestSourceTypeDetection:
         yield db
         
         # Cleanup
+        db.close()
         os.unlink(db_path)
     
     def test_local_source_type(self, temp_db):
@@ -157,6 +179,7 @@ class TestColumnVectors:
         yield db
         
         # Cleanup
+        db.close()
         os.unlink(db_path)
     
     def test_get_column_vectors_empty(self, temp_db):
@@ -164,3 +187,168 @@ class TestColumnVectors:
         result = temp_db.get_column_vectors()
         # get_column_vectors may return list of tuples or empty list
         assert len(result) == 0 or (hasattr(result, '__len__') and len(result) == 0)
+
+
+class TestVectorFile:
+    """Test the memory-mappable vector file kept alongside the database."""
+    
+    @pytest.fixture
+    def temp_db(self):
+        """Create a temporary database for testing."""
+        from database import Database
+        db_dir = tempfile.mkdtemp()
+        db = Database(os.path.join(db_dir, "test.db"))
+        yield db
+        
+        # Cleanup (database plus vector files)
+        for name in os.listdir(db_dir):
+            os.unlink(os.path.join(db_dir, name))
+        os.rmdir(db_dir)
+    
+    def _embeddings(self, *values):
+        import numpy as np
+        return [
+            {"type": "full_image", "embedding": np.full(4, v, dtype=np.float32)}
+            for v in values
+        ]
+    
+    def test_vector_file_matches_rows(self, temp_db):
+        """Vector file should hold every embedding of the requested dimension."""
+        import numpy as np
+        temp_db.save_frame_and_embeddings("/a.jpg", 10, 10, self._embeddings(1.0, 2.0))
+        
+        vec_path, ids_path = temp_db.get_vectors_mmap_path(4)
+        ids = np.fromfile(ids_path, dtype="<u8")
+        matrix = np.fromfile(vec_path, dtype=np.float32).reshape(-1, 4)
+        
+        assert len(ids) == 2
+        assert matrix[:, 0].tolist() == [1.0, 2.0]
+    
+    def test_vector_file_appends_new_rows(self, temp_db):
+        """Rows saved after the file exists should be appended, not rebuilt."""
+        import numpy as np
+        temp_db.save_frame_and_embeddings("/a.jpg", 10, 10, self._embeddings(1.0))
+        vec_path, ids_path = temp_db.get_vectors_mmap_path(4)
+        
+        temp_db.save_frame_and_embeddings("/b.jpg", 10, 10, self._embeddings(2.0))
+        assert os.path.getsize(vec_path) == 2 * 4 * 4
+        
+        assert temp_db.get_vectors_mmap_path(4) == (vec_path, ids_path)
+        assert len(np.fromfile(ids_path, dtype="<u8")) == 2
+    
+    def test_vector_file_rebuilds_after_delete(self, temp_db):
+        """Deleted embeddings should drop out of the vector file."""
+        import numpy as np
+        temp_db.save_frame_and_embeddings("/a.jpg", 10, 10, self._embeddings(1.0))
+        temp_db.save_frame_and_embeddings("/b.jpg", 10, 10, self._embeddings(2.0))
+        temp_db.get_vectors_mmap_path(4)
+        
+        temp_db.delete_frame("/a.jpg")
+        vec_path, _ = temp_db.get_vectors_mmap_path(4)
+        
+        assert np.fromfile(vec_path, dtype=np.float32).tolist() == [2.0] * 4
+    
+    def test_batch_save_matches_row_ids(self, temp_db):
+        """Batched inserts should append vectors under their real embedding IDs."""
+        import numpy as np
+        temp_db.save_frame_and_embeddings("/a.jpg", 10, 10, self._embeddings(1.0))
+        temp_db.get_vectors_mmap_path(4)
+        temp_db.batch_save_frames([
+            {"path": "/b.jpg", "width": 10, "height": 10, "embeddings": self._embeddings(2.0, 3.0)},
+            {"path": "/c.jpg", "width": 10, "height": 10, "embeddings": self._embeddings(4.0)},
+        ])
+        
+        # Read the appended files directly; get_vectors_mmap_path would rebuild a bad file
+        vec_path, ids_path = temp_db._vector_file_paths(4)
+        ids = np.fromfile(ids_path, dtype="<u8").tolist()
+        rows = dict(temp_db.get_column_vectors())
+        
+        assert len(ids) == 4
+        for i, vec in zip(ids, np.fromfile(vec_path, dtype=np.float32).reshape(-1, 4)):
+            assert np.frombuffer(rows[i], dtype=np.float32).tolist() == vec.tolist()
+    
+    def test_concurrent_rebuilds_do_not_collide(self, temp_db):
+        """Searches racing to rebuild stale vector files should all get a consistent pair."""
+        import threading
+        import numpy as np
+        temp_db.batch_save_frames([
+            {"path": f"/{i}.jpg", "width": 10, "height": 10, "embeddings": self._embeddings(float(i))}
+            for i in range(2000)
+        ])
+        temp_db.get_vectors_mmap_path(4)
+        temp_db.delete_frame("/0.jpg")
+        
+        barrier = threading.Barrier(4)
+        errors = []
+        
+        def rebuild():
+            barrier.wait()
+            try:
+                for _ in range(10):
+                    with temp_db.vector_files(4) as (vec_path, ids_path):
+                        ids = np.fromfile(ids_path, dtype="<u8")
+                        matrix = np.fromfile(vec_path, dtype=np.float32).reshape(-1, 4)
+                        assert len(ids) == len(matrix) == 1999
+            except Exception as e:
+                errors.append(e)
+            finally:
+                temp_db.close()
+        
+        threads = [threading.Thread(target=rebuild) for _ in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        
+        assert errors == []
+        assert not any(name.endswith(".tmp") for name in os.listdir(os.path.dirname(temp_db.db_path)))
+
+
+class TestSearchMetadata:
+    """Test the frame metadata returned alongside search hits."""
+    
+    @pytest.fixture
+    def temp_db(self):
+        """Create a temporary database for testing."""
+        from database import Database
+        with tempfile.NamedTemporaryFile(suffix='.db', delete=False) as f:
+            db_path = f.name
+        
+        db = Database(db_path)
+        yield db
+        
+        # Cleanup
+        db.close()
+        os.unlink(db_path)
+    
+    def _embedding(self, value, type_="full_image", object_class=None):
+        import numpy as np
+        return {"type": type_, "class": object_class, "embedding": np.full(4, value, dtype=np.float32)}
+    
+    def test_size_bytes_round_trips(self, temp_db):
+        """File size recorded at index time should come back with search metadata."""
+        temp_db.batch_save_frames([
+            {"path": "/a.jpg", "width": 10, "height": 10, "size_bytes": 2048,
+             "embeddings": [self._embedding(1.0)]},
+        ])
+        ids = [row[0] for row in temp_db.get_column_vectors()]
+        meta = temp_db.get_metadata_by_ids(ids)
+        assert meta[ids[0]]["size_bytes"] == 2048
+
+    def test_get_objects_for_frames_matches_single_lookup(self, temp_db):
+        """Batched object lookup should agree with the per-frame query."""
+        temp_db.save_frame_and_embeddings("/a.jpg", 10, 10, [
+            self._embedding(1.0), self._embedding(2.0, "object_crop", "car"),
+        ])
+        temp_db.save_frame_and_embeddings("/b.jpg", 10, 10, [self._embedding(3.0)])
+        objects = temp_db.get_objects_for_frames(["/a.jpg", "/b.jpg", "/a.jpg"])
+        assert objects == {"/a.jpg": temp_db.get_objects_for_frame("/a.jpg")} == {"/a.jpg": ["car"]}
+
+    def test_get_objects_for_frames_spans_chunks(self, temp_db):
+        """Lookups larger than one IN chunk should still cover every frame."""
+        paths = [f"/{i}.jpg" for i in range(1200)]
+        temp_db.batch_save_frames([
+            {"path": p, "width": 10, "height": 10, "embeddings": [self._embedding(1.0, "object_crop", "person")]}
+            for p in paths
+        ])
+        assert temp_db.get_objects_for_frames(paths) == {p: ["person"] for p in paths}
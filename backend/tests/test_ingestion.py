@@ -0,0 +1,104 @@
+"""
+Tests for ingestion sources - early stop of concurrent discovery.
+"""
+import pytest
+import sys
+import os
+import time
+import types
+import tempfile
+import threading
+
+# Add backend to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def local_ingestion(monkeypatch):
+    """Import local_ingestion with video_utils stubbed out (no OpenCV needed)."""
+    video_utils = types.ModuleType("video_utils")
+    video_utils.extract_frames = None
+    monkeypatch.setitem(sys.modules, "video_utils", video_utils)
+    monkeypatch.delitem(sys.modules, "local_ingestion", raising=False)
+    import local_ingestion
+    return local_ingestion
+
+
+@pytest.fixture
+def s3_ingestion(monkeypatch):
+    """Import s3_ingestion with boto3 stubbed out."""
+    monkeypatch.setitem(sys.modules, "boto3", types.ModuleType("boto3"))
+    monkeypatch.delitem(sys.modules, "s3_ingestion", raising=False)
+    import s3_ingestion
+    return s3_ingestion
+
+
+class TestLocalVideoDiscovery:
+    """Test concurrent video frame extraction."""
+
+    def test_early_stop_skips_queued_videos(self, local_ingestion, monkeypatch):
+        """Reaching max_files should not open the videos still waiting for a worker."""
+        opened = []
+        lock = threading.Lock()
+
+        def extract_frames(video_path, fps=1.0, max_frames=300):
+            with lock:
+                opened.append(video_path)
+            for i in range(2):
+                time.sleep(0.05)
+                yield object(), float(i), f"{video_path}#t={i}"
+
+        monkeypatch.setattr(local_ingestion, "extract_frames", extract_frames)
+        monkeypatch.setattr(local_ingestion, "VIDEO_WORKERS", 4)
+
+        with tempfile.TemporaryDirectory() as root:
+            for i in range(40):
+                open(os.path.join(root, f"clip{i}.mp4"), "wb").close()
+
+            frames = list(local_ingestion.LocalFileIngestor().discover_files(root, max_files=3))
+
+        assert len(frames) == 3
+        assert len(opened) <= 12
+
+
+class TestS3Discovery:
+    """Test concurrent S3 prefix listing."""
+
+    class FakeClient:
+        def __init__(self, prefixes):
+            self.prefixes = prefixes
+            self.listed = []
+            self.lock = threading.Lock()
+
+        def get_paginator(self, operation):
+            return self
+
+        def paginate(self, Bucket, Prefix, Delimiter=None):
+            if Delimiter:
+                return [{"CommonPrefixes": [{"Prefix": p} for p in self.prefixes]}]
+            with self.lock:
+                self.listed.append(Prefix)
+            time.sleep(0.01)
+            return [{"Contents": [{"Key": f"{Prefix}img.jpg"}]}]
+
+    def test_early_stop_skips_unlisted_prefixes(self, s3_ingestion, monkeypatch):
+        """Reaching max_files should not issue LIST requests for the remaining prefixes."""
+        client = self.FakeClient([f"day={i}/" for i in range(100)])
+        source = s3_ingestion.S3IngestionSource()
+        monkeypatch.setattr(source, "_get_client", lambda: client)
+        monkeypatch.setattr(s3_ingestion, "LIST_WORKERS", 4)
+
+        keys = list(source.discover_files("s3://bucket/", max_files=5))
+
+        assert len(keys) == 5
+        assert len(client.listed) <= 20
+
+    def test_lists_every_prefix(self, s3_ingestion, monkeypatch):
+        """Without a limit every sub-prefix should be listed."""
+        client = self.FakeClient([f"day={i}/" for i in range(10)])
+        source = s3_ingestion.S3IngestionSource()
+        monkeypatch.setattr(source, "_get_client", lambda: client)
+
+        keys = set(source.discover_files("s3://bucket/"))
+
+        assert keys == {f"s3://bucket/day={i}/img.jpg" for i in range(10)}